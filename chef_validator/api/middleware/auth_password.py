@@ -14,16 +14,60 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import datetime
+import hashlib
+import threading
+
 from keystoneclient import exceptions as keystone_exceptions
 from keystoneclient import session
+from oslo_config import cfg
+from oslo_utils import encodeutils
+from oslo_utils import timeutils
+from requests import adapters
+from requests.packages.urllib3.util import retry
 from webob import exc
 from chef_validator.common import log as logging
 
-from chef_validator.common.i18n import _LE
+from chef_validator.common.i18n import _, _LE
+from chef_validator.common import utils
 from chef_validator.api.middleware import context
 
 LOG = logging.getLogger(__name__)
 
+auth_password_opts = [
+    cfg.IntOpt('token_cache_time',
+               default=60,
+               help=_("Seconds a successful Keystone authentication is "
+                      "reused before validating the credentials again. "
+                      "Set to 0 to disable caching.")),
+    cfg.IntOpt('token_cache_size',
+               default=1000,
+               help=_("Maximum number of cached Keystone authentications.")),
+]
+cfg.CONF.register_opts(auth_password_opts, group='auth_password')
+
+# (user headers, deadline) keyed by a digest of the credentials
+_AUTH_CACHE = collections.OrderedDict()
+_AUTH_CACHE_LOCK = threading.Lock()
+
+# user headers set by the middleware, copied and filled in per token
+_USER_HEADERS = {
+    'keystone.token_info': None,
+    'HTTP_X_IDENTITY_STATUS': 'Confirmed',
+    'HTTP_X_PROJECT_ID': None,
+    'HTTP_X_PROJECT_NAME': None,
+    'HTTP_X_USER_ID': None,
+    'HTTP_X_USER_NAME': None,
+    'HTTP_X_ROLES': None,
+    'HTTP_X_SERVICE_CATALOG': None,
+    'HTTP_X_AUTH_TOKEN': None,
+}
+
+# connection pooling for the Keystone session shared by all requests
+POOL_CONNECTIONS = 64
+POOL_MAXSIZE = 256
+
 
 class KeystonePasswordAuthProtocol(object):
     """
@@ -36,7 +80,7 @@ class KeystonePasswordAuthProtocol(object):
     def __init__(self, app, conf):
         self.app = app
         self.conf = conf
-        self.session = session.Session()
+        self.session = self._create_session()
 
     def __call__(self, env, start_response):
         """Authenticate incoming request."""
@@ -49,6 +93,11 @@ class KeystonePasswordAuthProtocol(object):
         auth_url = env.get('HTTP_X_AUTH_URL')
         if not tenant:
             return self._reject_request(env, start_response, auth_url)
+        key = self._cache_key(username, password, tenant, auth_url)
+        cached = self._cache_get(key)
+        if cached is not None:
+            env.update(cached)
+            return self.app(env, start_response)
         try:
             ctx = context.RequestContext(
                 username=username,
@@ -64,9 +113,71 @@ class KeystonePasswordAuthProtocol(object):
                 keystone_exceptions.AuthorizationFailure):
             LOG.error(_LE("Context build failed"))
             return self._reject_request(env, start_response, auth_url)
-        env.update(self._build_user_headers(auth_ref))
+        headers = self._build_user_headers(auth_ref)
+        self._cache_set(key, auth_ref, headers)
+        env.update(headers)
         return self.app(env, start_response)
 
+    @staticmethod
+    def _create_session():
+        """Create a Keystone session backed by a larger connection pool, so
+        concurrent requests reuse open connections instead of handshaking.
+        """
+        sess = session.Session()
+        # keep the TCP keep-alive socket options of keystoneclient if present
+        adapter_cls = getattr(session, 'TCPKeepAliveAdapter',
+                              adapters.HTTPAdapter)
+        adapter = adapter_cls(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=POOL_MAXSIZE,
+            max_retries=retry.Retry(total=2, backoff_factor=0.1)
+        )
+        sess.session.mount('https://', adapter)
+        sess.session.mount('http://', adapter)
+        return sess
+
+    @staticmethod
+    def _cache_key(username, password, tenant, auth_url):
+        """Build a cache key that does not keep the password in memory."""
+        digest = hashlib.sha256()
+        for part in (username, auth_url, tenant):
+            digest.update(encodeutils.safe_encode(part or ''))
+            digest.update(b'|')
+        digest.update(encodeutils.safe_encode(password or ''))
+        return digest.digest()
+
+    @staticmethod
+    def _cache_get(key):
+        """Return the cached user headers for key, if still valid."""
+        with _AUTH_CACHE_LOCK:
+            entry = _AUTH_CACHE.pop(key, None)
+            if entry is None:
+                return None
+            if entry[1] <= timeutils.utcnow():
+                return None
+            # re-insert to mark as most recently used
+            _AUTH_CACHE[key] = entry
+            return entry[0]
+
+    @staticmethod
+    def _cache_set(key, auth_ref, headers):
+        """Cache headers until the configured TTL or token expiry."""
+        ttl = cfg.CONF.auth_password.token_cache_time
+        size = cfg.CONF.auth_password.token_cache_size
+        if ttl <= 0 or size <= 0:
+            return
+        deadline = timeutils.utcnow() + datetime.timedelta(seconds=ttl)
+        expires = utils.token_expiry(auth_ref)
+        if expires is not None:
+            deadline = min(deadline, expires)
+        if deadline <= timeutils.utcnow():
+            return
+        with _AUTH_CACHE_LOCK:
+            _AUTH_CACHE.pop(key, None)
+            _AUTH_CACHE[key] = (headers, deadline)
+            while len(_AUTH_CACHE) > size:
+                _AUTH_CACHE.popitem(last=False)
+
     @staticmethod
     def _reject_request(env, start_response, auth_url):
         """Redirect client to auth server."""
@@ -78,38 +189,45 @@ class KeystonePasswordAuthProtocol(object):
     def _build_user_headers(token_info):
         """Build headers that represent authenticated user from auth token."""
         if token_info.get('version') == 'v3':
-            keystone_token_info = {'token': token_info}
-            tenant_id = token_info['project']['id']
-            tenant_name = token_info['project']['name']
-            user_id = token_info['user']['id']
-            user_name = token_info['user']['name']
-            roles = ','.join(
-                [role['name'] for role in token_info['roles']])
-            service_catalog = None
-            auth_token = token_info['auth_token']
-        else:
-            keystone_token_info = token_info
-            tenant_id = token_info['token']['tenant']['id']
-            tenant_name = token_info['token']['tenant']['name']
-            user_id = token_info['user']['id']
-            user_name = token_info['user']['name']
-            roles = ','.join(
-                [role['name'] for role in token_info['user']['roles']])
-            service_catalog = token_info['serviceCatalog']
-            auth_token = token_info['token']['id']
-
-        headers = {
-            'keystone.token_info': keystone_token_info,
-            'HTTP_X_IDENTITY_STATUS': 'Confirmed',
-            'HTTP_X_PROJECT_ID': tenant_id,
-            'HTTP_X_PROJECT_NAME': tenant_name,
-            'HTTP_X_USER_ID': user_id,
-            'HTTP_X_USER_NAME': user_name,
-            'HTTP_X_ROLES': roles,
-            'HTTP_X_SERVICE_CATALOG': service_catalog,
-            'HTTP_X_AUTH_TOKEN': auth_token,
-        }
-        return headers
+            return _headers_v3(token_info)
+        return _headers_v2(token_info)
+
+
+def _headers_v2(token_info):
+    """Build user headers from a Keystone v2 token."""
+    token = token_info['token']
+    tenant = token['tenant']
+    user = token_info['user']
+    headers = _USER_HEADERS.copy()
+    headers['keystone.token_info'] = token_info
+    headers['HTTP_X_PROJECT_ID'] = tenant['id']
+    headers['HTTP_X_PROJECT_NAME'] = tenant['name']
+    headers['HTTP_X_USER_ID'] = user['id']
+    headers['HTTP_X_USER_NAME'] = user['name']
+    headers['HTTP_X_ROLES'] = ','.join(r['name'] for r in user['roles'])
+    headers['HTTP_X_SERVICE_CATALOG'] = token_info['serviceCatalog']
+    headers['HTTP_X_AUTH_TOKEN'] = token['id']
+    return headers
+
+
+def _headers_v3(token_info):
+    """Build user headers from a Keystone v3 token."""
+    project = token_info['project']
+    user = token_info['user']
+    headers = _USER_HEADERS.copy()
+    headers['keystone.token_info'] = {'token': token_info}
+    headers['HTTP_X_PROJECT_ID'] = project['id']
+    headers['HTTP_X_PROJECT_NAME'] = project['name']
+    headers['HTTP_X_USER_ID'] = user['id']
+    headers['HTTP_X_USER_NAME'] = user['name']
+    headers['HTTP_X_ROLES'] = ','.join(
+        r['name'] for r in token_info['roles'])
+    headers['HTTP_X_AUTH_TOKEN'] = token_info['auth_token']
+    return headers
+
+
+def list_opts():
+    yield 'auth_password', auth_password_opts
 
 
 def filter_factory(global_conf, **local_conf):
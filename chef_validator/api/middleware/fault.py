@@ -49,6 +49,7 @@ class FaultWrapper(wsgi.Middleware):
         'ActionInProgress': webob.exc.HTTPConflict,
         'ValueError': webob.exc.HTTPBadRequest,
         'EntityNotFound': webob.exc.HTTPNotFound,
+        'AmbiguousNameException': webob.exc.HTTPConflict,
         'StackNotFound': webob.exc.HTTPNotFound,
         'NotFound': webob.exc.HTTPNotFound,
         'ResourceActionNotSupported': webob.exc.HTTPBadRequest,
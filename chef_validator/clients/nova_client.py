@@ -11,13 +11,23 @@
 #  License for the specific language governing permissions and limitations
 #  under the License.
 
+import collections
+import datetime
+import hashlib
+import threading
+import time
+
 from novaclient import client as nc
 from novaclient import exceptions
 from chef_validator.common import log as logging
 from oslo_config import cfg
+from oslo_utils import encodeutils
+from oslo_utils import timeutils
 
+from chef_validator.common import utils
 from chef_validator.common.exception \
     import AmbiguousNameException, \
+    EntityNotFound, \
     ImageNotFound
 
 LOG = logging.getLogger(__name__)
@@ -25,17 +35,85 @@ opts = [
     cfg.StrOpt('api_version', default='2'),
     cfg.StrOpt('endpoint_type', default='publicURL'),
     cfg.StrOpt('endpoint'),
+    cfg.IntOpt('flavor_cache_time', default=60),
+    cfg.IntOpt('client_cache_time', default=60),
 ]
 CONF = cfg.CONF
 CONF.register_opts(opts, group="clients_nova")
 
+# (deadline, flavor ids, {flavor name: flavor id}) keyed by _cloud_key
+_FLAVOR_INDEX = collections.OrderedDict()
+_FLAVOR_INDEX_LOCK = threading.Lock()
+FLAVOR_INDEX_SIZE = 128
+# marks flavor names shared by several flavors in _FLAVOR_INDEX
+_AMBIGUOUS = object()
+
+# idle authenticated clients as (deadline, client), keyed by the nova
+# settings, tenant, endpoints and token they were built with. The deadline
+# is client_cache_time after authentication, capped by the token expiry.
+# A client is removed while a NovaClient uses it, so it is never shared
+# concurrently.
+_CLIENT_POOL = collections.OrderedDict()
+_CLIENT_POOL_LOCK = threading.Lock()
+CLIENT_POOL_SIZE = 128
+
+
+def _cloud_key(context):
+    """Identify the nova settings, tenant and cloud a request talks to."""
+    return (
+        CONF.clients_nova.api_version,
+        CONF.clients_nova.endpoint_type,
+        CONF.clients_nova.endpoint,
+        context.tenant_id,
+        context.auth_url
+    )
+
 
 class NovaClient(object):
     def __init__(self, context):
-        self._client = self.create_nova_client(context)
-        self._client.authenticate()
+        self._cloud_key = _cloud_key(context)
+        self._client, self._pool_key, self._pool_deadline = \
+            self.get_nova_client(context)
         self._machine = None
 
+    def get_nova_client(self, context):
+        """Return an authenticated client, reusing an idle one left by a
+        previous request with the same token so its connections are kept.
+        :return: (client, pool key, deadline to keep it pooled until)
+        """
+        key = self._cloud_key + (
+            hashlib.sha256(
+                encodeutils.safe_encode(context.auth_token or '')
+            ).digest(),
+        )
+        now = timeutils.utcnow()
+        with _CLIENT_POOL_LOCK:
+            entry = _CLIENT_POOL.pop(key, None)
+        if entry is not None and entry[0] > now:
+            return entry[1], key, entry[0]
+        client = self.create_nova_client(context)
+        client.authenticate()
+        deadline = now + datetime.timedelta(
+            seconds=CONF.clients_nova.client_cache_time)
+        expires = utils.token_expiry(context.auth_token_info)
+        if expires is not None:
+            deadline = min(deadline, expires)
+        return client, key, deadline
+
+    def release(self):
+        """Return the client to the idle pool once this instance is done.
+        Only call it after successful calls, so a client left in a bad
+        state by a failure is dropped instead of reused.
+        """
+        client, self._client = self._client, None
+        if client is None or self._pool_deadline <= timeutils.utcnow():
+            return
+        with _CLIENT_POOL_LOCK:
+            _CLIENT_POOL.pop(self._pool_key, None)
+            _CLIENT_POOL[self._pool_key] = (self._pool_deadline, client)
+            while len(_CLIENT_POOL) > CLIENT_POOL_SIZE:
+                _CLIENT_POOL.popitem(last=False)
+
     def create_nova_client(self, context):
         api_version = CONF.clients_nova.api_version
         endpoint_type = CONF.clients_nova.endpoint_type
@@ -47,7 +125,8 @@ class NovaClient(object):
             'user_id': context.user_id,
             'endpoint_type': endpoint_type,
             'bypass_url': nova_endpoint,
-            'auth_token': context.auth_token
+            'auth_token': context.auth_token,
+            'connection_pool': True
         }
         return nc.Client(
             api_version,
@@ -74,7 +153,7 @@ class NovaClient(object):
         if len(images) == 0:
             raise ImageNotFound(name=name)
         elif len(images) > 1:
-            raise AmbiguousNameException(name=name)
+            raise AmbiguousNameException(entity='Image', name=name)
         else:
             return self._format(images[0])
 
@@ -86,28 +165,61 @@ class NovaClient(object):
             exists = False
         return exists
 
+    def get_flavor_id(self, flavor):
+        """Return the id of the flavor with the given name or id"""
+        now = time.time()
+        with _FLAVOR_INDEX_LOCK:
+            entry = _FLAVOR_INDEX.pop(self._cloud_key, None)
+            if entry is not None and entry[0] > now:
+                # re-insert to mark as most recently used
+                _FLAVOR_INDEX[self._cloud_key] = entry
+        if entry is None or entry[0] <= now:
+            ids = set()
+            names = {}
+            for f in self._client.flavors.list():
+                ids.add(f.id)
+                names[f.name] = _AMBIGUOUS if f.name in names else f.id
+            entry = (now + CONF.clients_nova.flavor_cache_time, ids, names)
+            with _FLAVOR_INDEX_LOCK:
+                _FLAVOR_INDEX[self._cloud_key] = entry
+                while len(_FLAVOR_INDEX) > FLAVOR_INDEX_SIZE:
+                    _FLAVOR_INDEX.popitem(last=False)
+        if flavor in entry[1]:
+            return flavor
+        flavor_id = entry[2].get(flavor)
+        if flavor_id is None:
+            raise EntityNotFound(entity='Flavor', name=flavor)
+        if flavor_id is _AMBIGUOUS:
+            raise AmbiguousNameException(entity='Flavor', name=flavor)
+        return flavor_id
+
     def deploy_machine(self, name, image):
         LOG.debug("Creating a nova client")
         args = {
             'name': name,
             'image': self._client.images.find(name=image),
-            'flavor': self._client.flavors.find(name='m1.tiny'),
+            'flavor': self.get_flavor_id('m1.tiny'),
         }
         self._machine = self._client.servers.create(**args)
-        import time
-        status = self._machine.status
-        while status == 'BUILD':
+        while self._machine.status == 'BUILD':
             time.sleep(5)
             # Retrieve the instance again so the status field updates
-            status = self._client.servers.get(self._machine.id).status
+            self._machine = self._client.servers.get(self._machine.id)
 
     def delete_machine(self, name):
         server = self._client.servers.find(name=name)
         server.delete()
 
-    def get_ip(self):
-        """Return the server's IP"""
-        return self._client.servers.ips(self._machine)['public'][0]['addr']
+    def get_ip(self, net_type='public', ip_version=None):
+        """Return the server's first IP in the given network, optionally
+        restricted to one IP version
+        """
+        addrs = self._client.servers.ips(self._machine).get(net_type)
+        if addrs:
+            for ip in addrs:
+                if ip_version is None or ip['version'] == ip_version:
+                    return ip['addr']
+        raise EntityNotFound(entity='IP', name=net_type)
 
     def get_serial(self):
         """return a serial console url"""
@@ -76,7 +76,7 @@ class ImageNotFound(OpenstackException):
 
 
 class AmbiguousNameException(OpenstackException):
-    msg_fmt = _("Image name %(name)s is ambiguous")
+    msg_fmt = _("%(entity)s name %(name)s is ambiguous")
 
 
 # Chef exceptions
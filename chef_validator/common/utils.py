@@ -17,6 +17,7 @@ from __future__ import unicode_literals
 import datetime
 
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 from chef_validator.common import log as logging
 
 from chef_validator.common import exception
@@ -25,6 +26,24 @@ from chef_validator.common.i18n import _
 LOG = logging.getLogger(__name__)
 
 
+def token_expiry(token_info):
+    """Return the naive UTC expiry time of a Keystone token, or None if it
+    cannot be read. Accepts AccessInfo objects, v2 token bodies and the
+    {'token': ...} wrapper used for v3 in keystone.token_info.
+    """
+    try:
+        # AccessInfo.expires reads the token body and may raise KeyError
+        expires = getattr(token_info, 'expires', None)
+        if expires is None:
+            token = token_info['token']
+            expires = getattr(token, 'expires', None)
+            if expires is None:
+                expires = timeutils.parse_isotime(token['expires'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return timeutils.normalize_time(expires)
+
+
 class JSONSerializer(object):
     @staticmethod
     def default(response, result):
@@ -63,6 +63,9 @@ class ValidateEngine(object):
             # deploy machine
             n.deploy_machine(machine, image=image['name'])
             ip = n.get_ip()
+            # pool the nova client only after it worked, a failed one is
+            # dropped with this instance
+            n.release()
 
             # generic ssh connection
             c = ChefClientSSH(ip)
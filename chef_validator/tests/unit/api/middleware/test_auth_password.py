@@ -14,10 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
 from keystoneclient.auth.identity import v3 as ks_v3_auth
 from keystoneclient import exceptions as keystone_exc
 from keystoneclient import session as ks_session
 import mox
+from requests import adapters
 import webob
 
 from chef_validator.api.middleware import auth_password
@@ -104,6 +107,8 @@ class KeystonePasswordAuthProtocolTest(ValidatorTestCase):
         self.app = FakeApp()
         self.middleware = auth_password.KeystonePasswordAuthProtocol(
             self.app, self.config)
+        auth_password._AUTH_CACHE.clear()
+        self.addCleanup(auth_password._AUTH_CACHE.clear)
 
     def _start_fake_response(self, status, headers):
         self.response_status = int(status.split(' ', 1)[0])
@@ -134,6 +139,45 @@ class KeystonePasswordAuthProtocolTest(ValidatorTestCase):
         self.middleware(req.environ, self._start_fake_response)
         self.m.VerifyAll()
 
+    def test_valid_request_is_cached(self):
+        mock_auth = self.m.CreateMock(ks_v3_auth.Password)
+        self.m.StubOutWithMock(ks_v3_auth, 'Password')
+
+        ks_v3_auth.Password(auth_url=self.config['auth_uri'],
+                            password='goodpassword',
+                            project_domain_id='default', project_id=None,
+                            project_name='user_name1',
+                            user_domain_id='default',
+                            username='user_name1').AndReturn(mock_auth)
+
+        token = copy.deepcopy(TOKEN_V3_RESPONSE)
+        token['token']['expires'] = '2999-01-01T00:00:10.000123Z'
+        m = mock_auth.get_access(mox.IsA(ks_session.Session))
+        m.AndReturn(token)
+
+        self.app.expected_env['keystone.token_info'] = {'token': token}
+        self.m.ReplayAll()
+        for _ in range(2):
+            req = webob.Request.blank('/tenant_id1/')
+            req.headers['X_AUTH_USER'] = 'user_name1'
+            req.headers['X_AUTH_KEY'] = 'goodpassword'
+            req.headers['X_AUTH_URL'] = self.config['auth_uri']
+            self.middleware(req.environ, self._start_fake_response)
+        self.m.VerifyAll()
+        self.assertEqual(1, len(auth_password._AUTH_CACHE))
+
+    def test_session_uses_pooled_adapter(self):
+        sess = self.middleware.session
+        for prefix in ('http://', 'https://'):
+            adapter = sess.session.adapters[prefix]
+            self.assertIsInstance(adapter, adapters.HTTPAdapter)
+            self.assertEqual(auth_password.POOL_CONNECTIONS,
+                             adapter._pool_connections)
+            self.assertEqual(auth_password.POOL_MAXSIZE,
+                             adapter._pool_maxsize)
+            self.assertEqual(2, adapter.max_retries.total)
+            self.assertEqual(0.1, adapter.max_retries.backoff_factor)
+
     def test_request_with_bad_credentials(self):
         self.m.StubOutWithMock(ks_v3_auth, 'Password')
 
@@ -14,7 +14,10 @@
 
 import mock
 from chef_validator.api.middleware import context
+from chef_validator.clients import nova_client
 from chef_validator.clients.nova_client import NovaClient
+from chef_validator.common.exception import AmbiguousNameException
+from chef_validator.common.exception import EntityNotFound
 from chef_validator.tests.unit.base import ValidatorTestCase
 
 
@@ -42,8 +45,55 @@ class NovaClientTestCase(ValidatorTestCase):
         """Setup Environment"""
         super(NovaClientTestCase, self).setUp()
         NovaClient.create_nova_client = mock.MagicMock()
+        nova_client._CLIENT_POOL.clear()
+        self.addCleanup(nova_client._CLIENT_POOL.clear)
         self.client = NovaClient(dummy_context())
         self.client._client = mock.MagicMock()
+        nova_client._FLAVOR_INDEX.clear()
+        self.addCleanup(nova_client._FLAVOR_INDEX.clear)
+
+    def test_get_nova_client_reuses_released(self):
+        """Test released clients are reused for the same token"""
+        create = NovaClient.create_nova_client
+        create.reset_mock()
+        NovaClient(dummy_context())
+        self.assertEqual(1, create.call_count)
+        self.client.release()
+        self.assertIsNone(self.client._client)
+        NovaClient(dummy_context())
+        self.assertEqual(1, create.call_count)
+        NovaClient(dummy_context(tenant_id='other_tenant_id'))
+        self.assertEqual(2, create.call_count)
+
+    def test_get_nova_client_settings_in_key(self):
+        """Test clients are not reused across nova settings"""
+        create = NovaClient.create_nova_client
+        create.reset_mock()
+        self.client.release()
+        self.override_config('endpoint_type', 'internalURL', 'clients_nova')
+        NovaClient(dummy_context())
+        self.assertEqual(1, create.call_count)
+
+    def test_get_nova_client_token_expired(self):
+        """Test clients are not pooled past their token expiry"""
+        ctx = dummy_context()
+        ctx.auth_token_info = {
+            'token': {'expires': '2000-01-01T00:00:10.000123Z'}}
+        create = NovaClient.create_nova_client
+        create.reset_mock()
+        client = NovaClient(ctx)
+        client.release()
+        self.assertEqual({}, dict(nova_client._CLIENT_POOL))
+
+    def test_get_nova_client_cache_disabled(self):
+        """Test clients are not reused without a cache time"""
+        self.override_config('client_cache_time', 0, 'clients_nova')
+        create = NovaClient.create_nova_client
+        create.reset_mock()
+        client = NovaClient(dummy_context())
+        client.release()
+        NovaClient(dummy_context())
+        self.assertEqual(2, create.call_count)
 
     def test_list(self):
         """Test list function"""
@@ -78,6 +128,23 @@ class NovaClientTestCase(ValidatorTestCase):
         observed = self.client.get_ip()
         self.assertEqual(expected, observed)
 
+    def test_get_ip_version(self):
+        """Test get_ip function with IPv6 only and version filters"""
+        addresses = {
+            'public': [{'version': 6,
+                        'addr': '2401:1801:7800:0101:c058:dd33:ff18:04e6'}]}
+        self.client._client.servers.ips.return_value = addresses
+        self.assertEqual('2401:1801:7800:0101:c058:dd33:ff18:04e6',
+                         self.client.get_ip())
+        self.assertRaises(EntityNotFound, self.client.get_ip, 'public', 4)
+
+    def test_get_ip_missing_network(self):
+        """Test get_ip function without addresses in the network"""
+        addresses = {'private': [{'version': 4, 'addr': '10.13.12.13'}]}
+        self.client._client.servers.ips.return_value = addresses
+        self.assertRaises(EntityNotFound, self.client.get_ip)
+        self.assertRaises(EntityNotFound, self.client.get_ip, 'private', 6)
+
     def test_get_machine(self):
         """Test get_machine function"""
         self.client._client.servers.find(name="mymachine").return_value = True
@@ -85,8 +152,57 @@ class NovaClientTestCase(ValidatorTestCase):
         observed = self.client.get_machine("mymachine")
         self.assertEqual(expected, observed)
 
+    def test_get_flavor_id(self):
+        """Test get_flavor_id function"""
+        flavor = mock.MagicMock()
+        flavor.id = "1"
+        flavor.name = "m1.tiny"
+        self.client._client.flavors.list.return_value = [flavor]
+        self.assertEqual("1", self.client.get_flavor_id("m1.tiny"))
+        self.assertEqual("1", self.client.get_flavor_id("1"))
+        self.assertRaises(EntityNotFound, self.client.get_flavor_id, "m1.xl")
+        self.client._client.flavors.list.assert_called_once_with()
+
+    def test_get_flavor_id_cached_per_cloud(self):
+        """Test get_flavor_id keeps a bounded index per cloud"""
+        self.patch(nova_client, 'FLAVOR_INDEX_SIZE', 1)
+        flavor = mock.MagicMock()
+        flavor.id = "1"
+        flavor.name = "m1.tiny"
+        self.client._client.flavors.list.return_value = [flavor]
+        self.client.get_flavor_id("m1.tiny")
+        other = NovaClient(dummy_context(tenant_id='other_tenant_id'))
+        other._client = self.client._client
+        other.get_flavor_id("m1.tiny")
+        self.assertEqual(2, self.client._client.flavors.list.call_count)
+        self.assertEqual([other._cloud_key],
+                         list(nova_client._FLAVOR_INDEX))
+
+    def test_get_flavor_id_ambiguous(self):
+        """Test get_flavor_id function with duplicated flavor names"""
+        tiny = mock.MagicMock()
+        tiny.id = "1"
+        tiny.name = "m1.tiny"
+        other = mock.MagicMock()
+        other.id = "2"
+        other.name = "m1.tiny"
+        named_as_id = mock.MagicMock()
+        named_as_id.id = "3"
+        named_as_id.name = "1"
+        self.client._client.flavors.list.return_value = [
+            tiny, other, named_as_id]
+        exc = self.assertRaises(AmbiguousNameException,
+                                self.client.get_flavor_id, "m1.tiny")
+        self.assertEqual("Flavor name m1.tiny is ambiguous", str(exc))
+        self.assertEqual("1", self.client.get_flavor_id("1"))
+        self.assertEqual("2", self.client.get_flavor_id("2"))
+
     def test_deploy_machine(self):
         """Test deploy_machine function"""
+        flavor = mock.MagicMock()
+        flavor.id = "1"
+        flavor.name = "m1.tiny"
+        self.client._client.flavors.list.return_value = [flavor]
         machine = mock.MagicMock()
         self.client._client.servers.create.return_value = machine
         expected = machine
@@ -94,6 +210,21 @@ class NovaClientTestCase(ValidatorTestCase):
         observed = self.client._machine
         self.assertEqual(expected, observed)
 
+    def test_deploy_machine_waits_for_build(self):
+        """Test deploy_machine keeps the refreshed server"""
+        flavor = mock.MagicMock()
+        flavor.id = "1"
+        flavor.name = "m1.tiny"
+        self.client._client.flavors.list.return_value = [flavor]
+        building = mock.MagicMock(id="myid", status="BUILD")
+        active = mock.MagicMock(id="myid", status="ACTIVE")
+        self.client._client.servers.create.return_value = building
+        self.client._client.servers.get.return_value = active
+        with mock.patch('time.sleep'):
+            self.client.deploy_machine("mymachine", "myimage")
+        self.client._client.servers.get.assert_called_once_with("myid")
+        self.assertEqual(active, self.client._machine)
+
     def test_delete_machine(self):
         """Test delete_machine function"""
         machine = mock.MagicMock()
@@ -14,9 +14,12 @@
 #  under the License.
 """Tests for chef_validator.common.utils """
 from __future__ import unicode_literals
+import datetime
+
 import mock
 from chef_validator.common.utils import JSONDeserializer
 from chef_validator.common.utils import JSONSerializer
+from chef_validator.common.utils import token_expiry
 from chef_validator.tests.unit.base import ValidatorTestCase
 
 
@@ -86,3 +89,26 @@ class JSONSerializerTestCase(ValidatorTestCase):
         super(JSONSerializerTestCase, self).tearDown()
         self.m.UnsetStubs()
         self.m.ResetAll()
+
+
+class TokenExpiryTestCase(ValidatorTestCase):
+    """Tests for function token_expiry """
+
+    def test_token_expiry(self):
+        """Tests expiry read from v2 bodies and v3 wrappers """
+        expected = datetime.datetime(2020, 1, 1, 0, 0, 10, 123)
+        v2 = {'token': {'expires': '2020-01-01T00:00:10.000123Z'}}
+        v3 = {'token': mock.Mock(expires=expected)}
+        self.assertEqual(expected, token_expiry(v2))
+        self.assertEqual(expected, token_expiry(v3))
+
+    def test_token_expiry_malformed(self):
+        """Tests malformed tokens have no expiry """
+        class MalformedAccess(dict):
+            @property
+            def expires(self):
+                return self['token']['expires']
+
+        self.assertIsNone(token_expiry(MalformedAccess()))
+        self.assertIsNone(token_expiry({'token': {}}))
+        self.assertIsNone(token_expiry(None))